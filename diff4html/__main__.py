@@ -0,0 +1,5 @@
+import sys
+
+from diff4html.cli import main
+
+sys.exit(main())
@@ -0,0 +1,153 @@
+import hashlib
+import sys
+import threading
+import typing as t
+from collections import OrderedDict
+from collections.abc import Mapping
+
+
+class CacheInfo(t.NamedTuple):
+    """ Cache statistics """
+    hits: int
+    misses: int
+    maxsize: int
+    currsize: int
+    maxbytes: t.Optional[int]
+    currbytes: int
+
+
+class LRUCache:
+    """ LRUCache
+
+    Least recently used cache bounded both by the number of entries & their
+    estimated size in bytes.
+
+    """
+
+    maxsize: int
+    """ Max number of entries """
+
+    maxbytes: t.Optional[int]
+    """ Max estimated size of all entries """
+
+    hits: int
+    """ Number of successful lookups """
+
+    misses: int
+    """ Number of failed lookups """
+
+    _data: OrderedDict[t.Hashable, tuple[t.Any, int]]
+    """ Entries along with their sizes from the least recently used one """
+
+    _bytes: int
+    """ Estimated size of all entries """
+
+    def __init__(self, maxsize: int = 128, maxbytes: t.Optional[int] = None):
+        self.maxsize = maxsize
+        self.maxbytes = maxbytes
+        self.hits = self.misses = self._bytes = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key: t.Hashable) -> bool:
+        return key in self._data
+
+    def get(self, key: t.Hashable, default: t.Any = None) -> t.Any:
+        """ Get entry & mark it as the most recently used one """
+        with self._lock:
+            if key not in self._data:
+                self.misses += 1
+                return default
+            self.hits += 1
+            self._data.move_to_end(key)
+            return self._data[key][0]
+
+    def put(self, key: t.Hashable, value: t.Any, size: int = 0) -> None:
+        """ Put entry & evict the least recently used ones beyond bounds """
+        if self.maxbytes is not None and size > self.maxbytes:
+            return # would evict everything & still not fit
+        with self._lock:
+            if key in self._data:
+                self._bytes -= self._data.pop(key)[1]
+            self._data[key] = (value, size)
+            self._bytes += size
+            while len(self._data) > self.maxsize or (
+                self.maxbytes is not None and self._bytes > self.maxbytes
+            ):
+                self._bytes -= self._data.popitem(last=False)[1][1]
+
+    def pop(self, key: t.Hashable, default: t.Any = None) -> t.Any:
+        """ Remove entry & get it """
+        with self._lock:
+            if key not in self._data:
+                return default
+            value, size = self._data.pop(key)
+            self._bytes -= size
+            return value
+
+    def clear(self) -> None:
+        """ Remove all entries & reset statistics """
+        with self._lock:
+            self._data.clear()
+            self.hits = self.misses = self._bytes = 0
+
+    def info(self) -> CacheInfo:
+        """ Get cache statistics """
+        return CacheInfo(
+            self.hits,
+            self.misses,
+            self.maxsize,
+            len(self._data),
+            self.maxbytes,
+            self._bytes
+        )
+
+
+lru: t.Optional[LRUCache] = None
+""" Process-wide cache of HtmlDicts & HtmlDiffs, disabled by default """
+
+
+def enable(maxsize: int = 128, maxbytes: t.Optional[int] = None) -> LRUCache:
+    """ Enable process-wide cache """
+    global lru # pylint: disable=global-statement
+    lru = LRUCache(maxsize=maxsize, maxbytes=maxbytes)
+    return lru
+
+
+def disable() -> None:
+    """ Disable process-wide cache & drop its entries """
+    global lru # pylint: disable=global-statement
+    lru = None
+
+
+def digest(source: t.Union[str, bytes, bytearray, memoryview]) -> bytes:
+    """ Get source digest """
+    return hashlib.blake2b(
+        source.encode() if isinstance(source, str) else source,
+        digest_size=16
+    ).digest()
+
+
+def sizeof(o: t.Any) -> int:
+    """ Estimate deep size of a structure in bytes
+
+    Objects shared within the structure, e.g. interned keys, are counted once.
+
+    """
+    seen: set[int] = set()
+    size: int = 0
+    stack: list[t.Any] = [o]
+    while stack:
+        if id(x := stack.pop()) in seen:
+            continue
+        seen.add(id(x))
+        size += sys.getsizeof(x)
+        if isinstance(x, Mapping):
+            stack.extend(x.keys())
+            stack.extend(x.values())
+        elif isinstance(x, (list, tuple)):
+            stack.extend(x)
+    return size
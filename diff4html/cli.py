@@ -0,0 +1,384 @@
+import argparse
+import functools
+import os
+import sys
+import time
+import typing as t
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from lxml import html
+
+from diff4html.cache import digest
+from diff4html.diff import (
+    HtmlDict, HtmlDiff, _node, decode_version, encode_version, resolve
+)
+from diff4html.serializer import dumps, loads
+
+Task = tuple[str, str, str]
+""" Snapshot pair to diff: id, base path & new path """
+
+Result = tuple[t.Optional[bytes], Counter]
+""" Serialized record to write (if any) & its statistics """
+
+FORMATS: tuple[str, ...] = ("jsonl", "bin")
+""" Stream formats: JSON lines or JSON records prefixed with 4-byte length """
+
+
+def manifest(f: t.TextIO) -> t.Iterator[Task]:
+    """ Read snapshot pairs from manifest stream of JSON lines """
+    with f:
+        for line in filter(str.strip, f):
+            x = loads(line)
+            yield x.get("id", x["new"]), x["base"], x["new"]
+
+
+def pairs(inputs: t.Sequence[str]) -> tuple[t.Iterator[Task], int]:
+    """ Get snapshot pairs to diff
+
+    Pair files with the same relative paths of two directories or read them
+    lazily from a manifest file (- for stdin) of JSON lines with base, new &
+    optional id keys. Also count unmatched files of both directories.
+
+    """
+    if len(inputs) == 2 and all(os.path.isdir(x) for x in inputs):
+        files = [
+            {p.relative_to(x).as_posix() for p in Path(x).rglob("*") if (
+                p.is_file()
+            )} for x in inputs
+        ]
+        return (
+            (k, os.path.join(inputs[0], k), os.path.join(inputs[1], k))
+            for k in sorted(files[0] & files[1])
+        ), len(files[0] ^ files[1])
+    if len(inputs) != 1:
+        raise ValueError(
+            "either two directories or a single manifest file expected"
+        )
+    return manifest(sys.stdin if inputs[0] == "-" else open(inputs[0], "r")), 0
+
+
+def destination(root: str, _id: t.Any) -> Path:
+    """ Get output path of record id inside root directory
+
+    Absolute ids are taken relative to the root, while ids escaping it, e.g.
+    with .. parts, are rejected.
+
+    """
+    path = Path(str(_id))
+    dest = Path(root, path.relative_to(path.anchor))
+    if not dest.resolve().is_relative_to(Path(root).resolve()) or (
+        dest.resolve() == Path(root).resolve()
+    ):
+        raise ValueError("record id escapes output directory: '%s'" % _id)
+    return dest
+
+
+def read(f: t.BinaryIO, fmt: str) -> t.Iterator[bytes]:
+    """ Read serialized records from stream """
+    if fmt == "jsonl":
+        yield from filter(bytes.strip, f)
+        return
+    while header := f.read(4):
+        yield f.read(int.from_bytes(header, "big"))
+
+
+def write(f: t.BinaryIO, fmt: str, record: bytes) -> int:
+    """ Write serialized record to stream & get the number of bytes written """
+    return f.write(
+        record + b"\n" if fmt == "jsonl" else
+        len(record).to_bytes(4, "big") + record
+    )
+
+
+def imap(
+    func: t.Callable[[t.Any], Result],
+    tasks: t.Iterable[t.Any],
+    workers: int = 1
+) -> t.Iterator[Result]:
+    """ Map tasks in order with a pool of worker processes
+
+    Keep only a few tasks per worker in flight, so that input & output are
+    streamed rather than loaded entirely. A single worker runs in process.
+
+    """
+    if workers == 1:
+        yield from map(func, tasks)
+        return
+    with ProcessPoolExecutor(workers) as pool:
+        pending: deque = deque()
+        for task in tasks:
+            pending.append(pool.submit(func, task))
+            if len(pending) >= workers * 4:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def _failed(_id: t.Any, e: Exception, stats: Counter) -> Result:
+    """ Get error record of a failed task """
+    stats["failed"] += 1
+    return dumps({
+        "id": _id, "error": "%s: %s" % (e.__class__.__name__, e)
+    }).encode(), stats
+
+
+def _diff(options: dict, task: Task) -> Result:
+    """ Encode new snapshot against the base one """
+    _id, base_path, new_path = task
+    stats: Counter = Counter(pages=1)
+    try:
+        sources = [Path(x).read_bytes() for x in (base_path, new_path)]
+        base, new = [HtmlDict(x, ignore=options["ignore"]) for x in sources]
+        version = encode_version(base, new, **options["budget"])
+        record = dumps({
+            "id": _id,
+            "base": os.path.abspath(base_path),
+            "digest": digest(str(base)).hex(),
+            "ignore": options["ignore"],
+            "diff" if isinstance(version, HtmlDiff) else "snapshot": (
+                version.data
+            ),
+        }).encode()
+    except Exception as e: # pylint: disable=broad-except
+        return _failed(_id, e, stats)
+    stats.update(
+        bytes_in=sum(map(len, sources)),
+        bytes_out=len(record),
+        delta=len(record),
+        full=len(sources[1]),
+        snapshots=not isinstance(version, HtmlDiff),
+    )
+    return record, stats
+
+
+def _apply(options: dict, record: bytes) -> Result:
+    """ Decode snapshot from record against its base one """
+    stats: Counter = Counter(pages=1)
+    r: t.Any = None
+    try:
+        r = loads(record)
+        if "error" in r: # pass failures of diff through
+            raise ValueError(r["error"])
+        if options["output_dir"]:
+            dest = destination(options["output_dir"], r["id"])
+        source = Path(r["base"]).read_bytes()
+        base = HtmlDict(source, ignore=r["ignore"])
+        if digest(str(base)).hex() != r["digest"]:
+            raise ValueError("wrong snapshot used for applying diff")
+        version = HtmlDiff(
+            [tuple(x) for x in r["diff"]], sub=base
+        ) if "diff" in r else HtmlDict(**r["snapshot"], ignore=r["ignore"])
+        if not options["xpath"]:
+            page = decode_version(base, version)
+        elif isinstance(version, HtmlDiff):
+            page = base.restore_subtree(version, options["xpath"])
+        else:
+            path = resolve(version.data, options["xpath"])
+            page = HtmlDict(**{str(path[-1]): _node(version.data, path)})
+
+        if options["output_dir"]:
+            dest.parent.mkdir(parents=True, exist_ok=True)
+            res, written = None, dest.write_bytes(
+                html.tostring(page.to_lxml(), encoding="utf-8")
+            )
+        else:
+            res = dumps({"id": r["id"], "snapshot": page.data}).encode()
+            written = len(res)
+    except Exception as e: # pylint: disable=broad-except
+        return _failed(r and r.get("id"), e, stats)
+    stats.update(
+        bytes_in=len(source) + len(record),
+        bytes_out=written,
+        delta=len(record),
+        full=len(str(page).encode()),
+    )
+    return res, stats
+
+
+def _bench(options: dict, task: Task) -> Result:
+    """ Profile parsing, diff & apply of the snapshot pair in nanoseconds """
+    _id, base_path, new_path = task
+    stats: Counter = Counter(pages=1)
+    try:
+        sources = [Path(x).read_bytes() for x in (base_path, new_path)]
+        start = time.perf_counter_ns()
+        base, new = [HtmlDict(x, ignore=options["ignore"]) for x in sources]
+        stats["parse"] = (end := time.perf_counter_ns()) - start
+        version = encode_version(base, new, **options["budget"])
+        stats["diff"] = (start := time.perf_counter_ns()) - end
+        if decode_version(base, version) != new:
+            raise ValueError("restored snapshot doesn't match the new one")
+        stats["apply"] = time.perf_counter_ns() - start
+    except Exception as e: # pylint: disable=broad-except
+        return _failed(_id, e, stats)
+    stats.update(
+        bytes_in=sum(map(len, sources)),
+        delta=len(str(version).encode()),
+        full=len(sources[1]),
+        snapshots=not isinstance(version, HtmlDiff),
+    )
+    return None, stats
+
+
+def _size(n: float) -> str:
+    """ Format number of bytes """
+    for unit in ("B", "KB", "MB", "GB"):
+        if n < 1024 or unit == "GB":
+            break
+        n /= 1024
+    return "%.1f %s" % (n, unit)
+
+
+def report(
+    stats: Counter,
+    elapsed: float,
+    f: t.Optional[t.TextIO] = None
+) -> None:
+    """ Print throughput report to stderr by default """
+    f = f or sys.stderr
+    print(
+        "%d pages (%d failed, %d full snapshots) in %.2fs: %.1f pages/s" % (
+            stats["pages"], stats["failed"], stats["snapshots"], elapsed,
+            stats["pages"] / elapsed if elapsed else 0
+        ),
+        "bytes in: %s, bytes out: %s, delta ratio: %.1f%%" % (
+            _size(stats["bytes_in"]), _size(stats["bytes_out"]),
+            100 * stats["delta"] / stats["full"] if stats["full"] else 0
+        ),
+        sep="\n", file=f
+    )
+    if stages := [x for x in ("parse", "diff", "apply") if x in stats]:
+        print("cpu time: %s" % ", ".join(
+            "%s %.2fs" % (x, stats[x] / 1e9) for x in stages
+        ), file=f)
+
+
+def _workers(s: str) -> int:
+    """ Parse number of worker processes """
+    try:
+        if (n := int(s)) >= 0:
+            return n
+    except ValueError:
+        pass
+    raise argparse.ArgumentTypeError(
+        "non-negative integer expected: '%s'" % s
+    )
+
+
+def parser() -> argparse.ArgumentParser:
+    """ Get command-line arguments parser """
+    p = argparse.ArgumentParser(
+        prog="diff4html",
+        description="Diff & restore HTML snapshots in bulk"
+    )
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument(
+        "-w", "--workers", type=_workers, default=1,
+        help="number of worker processes, 0 for one per CPU (default: 1)"
+    )
+    common.add_argument(
+        "-f", "--format", choices=FORMATS, default="jsonl",
+        help="stream format of records (default: jsonl)"
+    )
+    inputs_ = argparse.ArgumentParser(add_help=False)
+    inputs_.add_argument(
+        "inputs", nargs="+", metavar="INPUT",
+        help="base & new snapshot directories or a manifest file (- for stdin)"
+    )
+    inputs_.add_argument(
+        "--ignore", action="append", default=[], metavar="TAG",
+        help="tag to ignore, may be repeated"
+    )
+    inputs_.add_argument(
+        "--max-changes", type=int, metavar="N",
+        help="store full snapshot if delta has more changes"
+    )
+    inputs_.add_argument(
+        "--max-delta-bytes", type=int, metavar="N",
+        help="store full snapshot if changes take more UTF-8 bytes (default: "
+        "size of the snapshot)"
+    )
+    inputs_.add_argument(
+        "--deadline", type=float, metavar="SECONDS",
+        help="store full snapshot if diff takes longer"
+    )
+
+    commands = p.add_subparsers(dest="command", required=True)
+    sub = commands.add_parser(
+        "diff", parents=[common, inputs_],
+        help="encode new snapshots as deltas against the base ones"
+    )
+    sub.add_argument(
+        "-o", "--output", default="-", help="output stream (default: stdout)"
+    )
+    sub = commands.add_parser(
+        "apply", aliases=["restore"], parents=[common],
+        help="restore new snapshots from records of diff"
+    )
+    sub.add_argument(
+        "input", nargs="?", default="-", help="input stream (default: stdin)"
+    )
+    sub.add_argument(
+        "-o", "--output", default="-", help="output stream (default: stdout)"
+    )
+    sub.add_argument(
+        "-d", "--output-dir",
+        help="write restored HTMLs by their ids here instead of the stream"
+    )
+    sub.add_argument(
+        "--xpath", help="restore only the node at XPath-like path"
+    )
+    commands.add_parser(
+        "bench", parents=[common, inputs_],
+        help="profile diff & apply of the snapshot pairs"
+    )
+    return p
+
+
+def main(argv: t.Optional[t.Sequence[str]] = None) -> int:
+    """ Run command-line tool & get exit code """
+    args = parser().parse_args(argv)
+    workers = args.workers or os.cpu_count() or 1
+    src: t.Optional[t.BinaryIO] = None
+
+    if args.command == "apply" or args.command == "restore":
+        func = functools.partial(_apply, {
+            "xpath": args.xpath, "output_dir": args.output_dir
+        })
+        src = sys.stdin.buffer if args.input == "-" else open(args.input, "rb")
+        tasks: t.Iterable = read(src, args.format)
+        unmatched = 0
+    else:
+        try:
+            tasks, unmatched = pairs(args.inputs)
+        except ValueError as e:
+            parser().error(str(e))
+        func = functools.partial(_diff if args.command == "diff" else _bench, {
+            "ignore": args.ignore,
+            "budget": {
+                "max_changes": args.max_changes,
+                "max_delta_bytes": args.max_delta_bytes,
+                "deadline": args.deadline,
+            },
+        })
+    if unmatched:
+        print("%d files without a pair skipped" % unmatched, file=sys.stderr)
+
+    out = getattr(args, "output", None)
+    dst = sys.stdout.buffer if out in (None, "-") else open(out, "wb")
+    stats: Counter = Counter()
+    start = time.perf_counter()
+    try:
+        for record, _stats in imap(func, tasks, workers):
+            if record is not None:
+                write(dst, args.format, record)
+            stats.update(_stats)
+    finally:
+        dst.flush()
+        for f in (src, dst):
+            if f not in (None, sys.stdin.buffer, sys.stdout.buffer):
+                f.close()
+    report(stats, time.perf_counter() - start)
+    return 1 if stats["failed"] else 0
@@ -1,16 +1,31 @@
 from __future__ import annotations
 
+import itertools
 import json
 import re
+import time
 import typing as t
 from collections import UserDict, UserList
+from collections.abc import Mapping
+from copy import deepcopy
 from textwrap import shorten
 from uuid import uuid4
 from warnings import warn
 
-from lxml import html
+from lxml import etree, html
 
-from diff4html.html import json2lxml, lxml2json, prepare, validate
+from diff4html import cache
+from diff4html.html import (
+    HtmlNode, Source, compact2json, get_tag, json2compact, json2lxml, lxml2json,
+    node2lxml, prepare, validate
+)
+from diff4html.serializer import dumps, loads
+
+Path = tuple[t.Union[str, int], ...]
+
+
+class BudgetExceeded(Exception):
+    """ Raised when diff calculation runs out of its budget """
 
 
 class HtmlDiff(UserList):
@@ -35,14 +50,14 @@ class HtmlDiff(UserList):
 
     def __str__(self) -> str:
         """ Serialize to JSON dump """
-        return json.dumps(self.data, ensure_ascii=False)
+        return dumps(self.data)
 
     def __repr__(self) -> str:
         """ Print in JSON format"""
         return "%s([\n%s\n])" % (
             self.__class__.__name__,
             ',\n'.join(['    %s:%s: %s' % (
-                x, y, (json.dumps(z, ensure_ascii=False) if z else None)
+                x, y, (dumps(z) if z else None)
             ) for x,y,z in self.data
         ]))
 
@@ -54,11 +69,64 @@ class HtmlDiff(UserList):
                     other.__class__.__name__
                 )
             )
-        if hash(other) != self._sub_hash:
-            raise ValueError(
-                "wrong snapshot used for applying diff"
+        return other + self
+
+
+class HtmlPatch(UserList):
+    """ HtmlPatch
+
+    HtmlPatch, in the context of page 2 - page 1, is a list of structural
+    changes in the form of (o, p, v), where o is an operation (add, remove,
+    replace or rename), p is a path of keys & list indexes to the node of
+    page 1 (or to the added one of page 2) and v is its value in page 2 -
+    (key, value) pair for a renamed node.
+
+    """
+
+    data: list[tuple[str, Path, t.Any]]
+    """ Data structure """
+
+    def __str__(self) -> str:
+        """ Serialize to JSON dump """
+        return dumps(self.data)
+
+    def __repr__(self) -> str:
+        """ Print in JSON format"""
+        return "%s([\n%s\n])" % (
+            self.__class__.__name__,
+            ',\n'.join(['    %s %s: %s' % (
+                o, dumps(p), shorten(dumps(v), width=100)
+            ) for o,p,v in self.data
+        ]))
+
+    def __add__(self, other: HtmlDict) -> HtmlDict: # type: ignore
+        """ Apply HtmlPatch to HtmlDict """
+        if not isinstance(other, HtmlDict):
+            raise TypeError(
+                "unsupported operand type(s) for +: 'HtmlPatch' and '%s'" % (
+                    other.__class__.__name__
+                )
             )
-        return HtmlDict(**json.loads(apply_diff(other, self)))
+        return other + self
+
+    def to_diff(self, base: HtmlDict) -> HtmlDiff:
+        """ Cast to HtmlDiff delta against the base snapshot
+
+        Takes O(page) time, as the patched copy of the base gets dumped & diffed
+        against it.
+
+        """
+        return (base + self) - base
+
+    @classmethod
+    def from_diff(cls, base: HtmlDict, delta: HtmlDiff) -> HtmlPatch:
+        """ Cast HtmlDiff delta against the base snapshot
+
+        Takes O(page) time, as the delta gets applied to the base dump & the
+        result is parsed & walked against it.
+
+        """
+        return t.cast(HtmlPatch, (base + delta).subtract(base, structural=True))
 
 
 class HtmlDict(UserDict, object):
@@ -68,29 +136,70 @@ class HtmlDict(UserDict, object):
 
     """
 
-    data: dict
+    data: t.Union[dict, HtmlNode] # type: ignore
     """ Data structure of UserDict """
 
-    _source: t.Optional[str]
-    """ Source string used to init object """
+    _source: t.Optional[Source]
+    """ Source string or bytes used to init object """
 
     _ignore: t.Collection
     """ List of ignored tags """
 
-    def __init__(self, *args, ignore: t.Collection = (), **kwargs):
+    _compact: bool
+    """ Flag to store data as read-only HtmlNode structure """
+
+    _spans: t.Optional[dict[tuple[int, t.Union[str, int]], tuple[int, int]]] = (
+        None
+    )
+    """ Node span index built on the first partial restore """
+
+    _spans_hash: t.Optional[int] = None
+    """ Hash sum of the dump the span index was built on """
+
+    _digest: t.Optional[tuple] = None
+    """ Cache key of source digest, ignored tags & compact flag """
+
+    def __init__(
+        self,
+        *args,
+        ignore: t.Collection = (),
+        compact: bool = False,
+        **kwargs
+    ):
         #  TODO: add xpath kwarg handling
-        if len(args) == 1 and isinstance(args[0], str):
+        self._ignore = ignore or tuple()
+        self._compact = compact
+        if len(args) == 1 and isinstance(args[0], (str, bytes, bytearray, memoryview)):
             self._source = args[0]
-            self._ignore = ignore or tuple()
+            tree = prepare(self._source)
+            args, kwargs = (), lxml2json(tree, ignore=ignore)
             # check if object converted back to lxml matches the source one
-            validate(self._source)
-
-            args, kwargs = (), lxml2json(
-                html.fromstring(prepare(self._source)), ignore=ignore
-            )
+            validate(tree, None if self._ignore else kwargs)
         else:
             self._source = None
         super().__init__(*args, **kwargs)
+        if compact:
+            self.data = json2compact(self.data)
+
+    def __setitem__(self, key: str, item: t.Any) -> None:
+        self._invalidate()
+        super().__setitem__(key, item)
+
+    def __delitem__(self, key: str) -> None:
+        self._invalidate()
+        super().__delitem__(key)
+
+    def _invalidate(self) -> None:
+        """ Drop state derived from data once it's changed in place
+
+        Evict the object from the process-wide cache as well, as its source
+        doesn't match it anymore.
+
+        """
+        self._spans = self._spans_hash = None
+        if self._digest is not None and cache.lru is not None:
+            cache.lru.pop(self._digest)
+        self._digest = None
 
     def __eq__(self, other: t.Self) -> bool: # type: ignore
         if not isinstance(other, self.__class__):
@@ -107,17 +216,23 @@ class HtmlDict(UserDict, object):
 
     def __str__(self) -> str:
         """ Serialize to JSON dump """
-        return json.dumps(self.data, ensure_ascii=False)
+        return dumps(self.data)
 
     def __repr__(self) -> str:
         """ Print object """
         return "%s(%s)" % (
             self.__class__.__name__,
-            shorten(json.dumps(self.data, ensure_ascii=False), width=500)
+            shorten(str(self), width=500)
         )
 
-    def __add__(self, other: HtmlDiff) -> t.Self:
-        """ Apply HtmlDiff delta to HtmlDict """
+    def __add__(self, other: t.Union[HtmlDiff, HtmlPatch]) -> t.Self:
+        """ Apply HtmlDiff delta or HtmlPatch to HtmlDict """
+        if isinstance(other, HtmlPatch):
+            return apply_patch(self.__class__(
+                **deepcopy(self.data) if not self._compact else self.data,
+                ignore=self._ignore,
+                compact=self._compact
+            ), other)
         if not isinstance(other, HtmlDiff):
             raise TypeError(
                 "unsupported operand type(s) for +: 'HtmlDict' and '%s'" % (
@@ -128,10 +243,31 @@ class HtmlDict(UserDict, object):
             raise ValueError(
                 "wrong snapshot used for applying diff"
             )
-        return self.__class__(**json.loads(apply_diff(self, other)))
+        return self.__class__(
+            **loads(apply_diff(self, other)),
+            ignore=self._ignore,
+            compact=self._compact
+        )
 
     def __sub__(self, other: t.Self) -> HtmlDiff:
         """ Get HtmlDiff delta """
+        return t.cast(HtmlDiff, self.subtract(other))
+
+    def subtract(
+        self,
+        other: t.Self,
+        max_changes: t.Optional[int] = None,
+        max_delta_bytes: t.Optional[int] = None,
+        deadline: t.Optional[float] = None,
+        structural: bool = False
+    ) -> t.Union[HtmlDiff, HtmlPatch]:
+        """ Get HtmlDiff delta or HtmlPatch within budget
+
+        Raise BudgetExceeded if there are more changes than max_changes, their
+        contents take more than max_delta_bytes of UTF-8 or it takes longer
+        than deadline seconds.
+
+        """
         if not isinstance(other, self.__class__):
             raise TypeError(
                 "unsupported operand type(s) for -: 'HtmlDict' and '%s'" % (
@@ -140,7 +276,103 @@ class HtmlDict(UserDict, object):
             )
         if set(self._ignore) ^ set(other._ignore):
             warn("ignored tags of both objects don't match")
-        return diff(self, other)
+        if cache.lru is None or not (self._digest and other._digest):
+            return diff(
+                self, other, max_changes, max_delta_bytes, deadline, structural
+            )
+        # memoize diff of cached snapshots by their digests
+        key = (self._digest, other._digest, structural)
+        if (res := cache.lru.get(key)) is None:
+            res = diff(
+                self, other, max_changes, max_delta_bytes, deadline, structural
+            )
+            cache.lru.put(key, res, size=cache.sizeof(res.data))
+        else: # memoized result took no time, but may not fit the rest
+            check_budget(res, max_changes, max_delta_bytes)
+        return res
+
+    @classmethod
+    def cached(
+        cls,
+        source: Source,
+        ignore: t.Collection = (),
+        compact: bool = False
+    ) -> t.Self:
+        """ Get HtmlDict from the process-wide cache
+
+        Look the object up by source digest & type (str one isn't decoded by
+        BOM or meta charset as bytes are), ignored tags & compact flag or build
+        & cache it. The same object is returned for the same source, so
+        it shouldn't be modified: apply_patch & changes of its top-level keys
+        evict it from the cache, while nested in-place changes aren't detected.
+        Works as a plain constructor if the cache is disabled.
+
+        """
+        if cache.lru is None:
+            return cls(source, ignore=ignore, compact=compact)
+        key = (
+            cache.digest(source),
+            isinstance(source, str),
+            frozenset(ignore),
+            compact
+        )
+        if (res := cache.lru.get(key)) is None:
+            res = cls(source, ignore=ignore, compact=compact)
+            res._digest = key
+            cache.lru.put(
+                key, res, size=cache.sizeof(res.data) + len(source)
+            )
+        return res
+
+    def restore_subtree(
+        self,
+        diff: HtmlDiff,
+        path: t.Union[str, t.Sequence[t.Union[str, int]]]
+    ) -> t.Self:
+        """ Apply HtmlDiff delta to a single node of HtmlDict
+
+        Restore only the node at XPath-like (e.g. /html/body/div[2]) or native
+        path resolved on this snapshot. The result is a one-key HtmlDict.
+
+        The snapshot is dumped & checked against the delta only once, on the
+        first partial restore. Setting or deleting its top-level keys drops the
+        check, while nested in-place changes made since aren't detected.
+
+        """
+        if not isinstance(diff, HtmlDiff):
+            raise TypeError(
+                "unsupported diff type: '%s'" % diff.__class__.__name__
+            )
+        # the page is dumped once for both the span index & the hash check
+        if self._spans is None:
+            self._spans, self._spans_hash = spans(self.data), hash(self)
+        if self._spans_hash != diff._sub_hash:
+            raise ValueError(
+                "wrong snapshot used for applying diff"
+            )
+        return self.__class__(
+            **loads(apply_diff(self, diff, path=path)),
+            ignore=self._ignore,
+            compact=self._compact
+        )
+
+    def changed_paths(
+        self,
+        other: t.Self,
+        limit: t.Optional[int] = None
+    ) -> t.Iterator[tuple[str, str]]:
+        """ Get XPath-like paths of nodes changed since other snapshot """
+        if not isinstance(other, self.__class__):
+            raise TypeError(
+                "unsupported operand type: '%s'" % other.__class__.__name__
+            )
+        return changes(self, other, limit=limit)
+
+    def to_dict(self) -> dict:
+        """ Get data as native dict structure """
+        return compact2json(self.data) if self._compact else t.cast(
+            dict, self.data
+        )
 
     def to_lxml(self) -> html.HtmlElement:
         return json2lxml(self.data)
@@ -180,7 +412,7 @@ def find(
             while i <= len(e) - 1 and not found:
                 if e == end_e and i == end_i:
                     found = True
-                    length = len(json.dumps(e[i], ensure_ascii=False))
+                    length = len(dumps(e[i]))
                     items.append(sep)
                 else:
                     _e, _length = _recurse(e[i])
@@ -196,14 +428,14 @@ def find(
                 if e is end_e and end_i and keys[i] == end_i:
                     found = True
                     if end_i and keys[i] == end_i: # if diff in key already
-                        length = len(json.dumps(e[keys[i]], ensure_ascii=False))
+                        length = len(dumps(e[keys[i]]))
                         items.append([keys[i], sep])
                 # if have to look at the value first (string one)
                 elif e[keys[i]] is end_e and end_i is None:
                     found = True
-                    length = len(json.dumps(e[keys[i]], ensure_ascii=False))
+                    length = len(dumps(e[keys[i]]))
                     items.append([keys[i], sep])
-                elif e is end_e and end_i == json.dumps({keys[i]: e[keys[i]]}, ensure_ascii=False):
+                elif e is end_e and end_i == dumps({keys[i]: e[keys[i]]}):
                     found = True
                     length = len(end_i[1:-1])
                     items.append([sep, None])
@@ -220,20 +452,86 @@ def find(
     s, length = _recurse(e)
     if length is None:
         raise ValueError("couldn't find element in a struct")
-    offset = len(json.dumps(s, ensure_ascii=False).split(f'"{sep}"', 1)[0].rstrip("}]"))
+    offset = len(dumps(s).split(f'"{sep}"', 1)[0].rstrip("}]"))
 
     return offset, length
 
 
+def check_budget(
+    d: t.Union[HtmlDiff, HtmlPatch],
+    max_changes: t.Optional[int] = None,
+    max_delta_bytes: t.Optional[int] = None
+) -> None:
+    """ Raise BudgetExceeded if ready changes don't fit the budget
+
+    Changes are measured the same way diff does while looking for them.
+
+    """
+    if max_changes is not None and len(d) > max_changes:
+        raise BudgetExceeded("more than %s changes found" % max_changes)
+    if max_delta_bytes is not None and sum(
+        len((dumps(x[2]) if isinstance(d, HtmlPatch) else x[2] or "").encode())
+        for x in d
+    ) > max_delta_bytes:
+        raise BudgetExceeded(
+            "changes take more than %s bytes" % max_delta_bytes
+        )
+
+
 def diff(
     e1: t.Union[dict, HtmlDict],
-    e2: t.Union[dict, HtmlDict]
-) -> HtmlDiff:
-    """ Get changes between two HTML dicts """
+    e2: t.Union[dict, HtmlDict],
+    max_changes: t.Optional[int] = None,
+    max_delta_bytes: t.Optional[int] = None,
+    deadline: t.Optional[float] = None,
+    structural: bool = False
+) -> t.Union[HtmlDiff, HtmlPatch]:
+    """ Get changes between two HTML dicts
+
+    Get HtmlDiff delta or HtmlPatch if structural flag is passed. Raise
+    BudgetExceeded as soon as there are more changes than max_changes, their
+    contents take more than max_delta_bytes of UTF-8 or it takes longer than
+    deadline seconds.
+
+    """
 
-    d: list[tuple[int, int, t.Optional[str]]] = []
+    d: list[tuple] = []
     """ List to accumulate found changes here """
 
+    size: int = 0
+    """ Size of accumulated changes contents """
+
+    end: t.Optional[float] = None if deadline is None else (
+        time.monotonic() + deadline
+    )
+    """ Monotonic time to abort at """
+
+    def _check(change: tuple, length: int) -> None:
+        """ Accumulate change & check if the budget is exceeded """
+        nonlocal size
+        d.append(change)
+        size += length
+        if max_changes is not None and len(d) > max_changes:
+            raise BudgetExceeded("more than %s changes found" % max_changes)
+        if max_delta_bytes is not None and size > max_delta_bytes:
+            raise BudgetExceeded(
+                "changes take more than %s bytes" % max_delta_bytes
+            )
+
+    if structural:
+        for op, path, value in _walk(
+            e1.data if isinstance(e1, HtmlDict) else e1,
+            e2.data if isinstance(e2, HtmlDict) else e2,
+            end=end
+        ):
+            value = (value[0], compact2json(value[1])) if op == "rename" else (
+                compact2json(value)
+            )
+            _check((op, path, value), 0 if max_delta_bytes is None else len(
+                dumps(value).encode()
+            ))
+        return HtmlPatch(d)
+
     def _recurse(e1: t.Any, e2: t.Any, path: list = []) -> None:
         """ Process recursively
 
@@ -247,6 +545,9 @@ def diff(
         if e1 is None and e2 is None:
             return
 
+        if end is not None and time.monotonic() >= end:
+            raise BudgetExceeded("deadline of %ss exceeded" % deadline)
+
         # Save the dict on a recursion root step
         if path is None:
             if not isinstance(e2, dict) or not e2:
@@ -280,14 +581,14 @@ def diff(
                 if not _k: # if the key is missing in prev version
                     _recurse({k:v}, None, path=[*path])
                 elif k != _k: # if keys differ
-                    _recurse({k:v}, _k, path=[*path, e2, json.dumps({_k:e2[_k]}, ensure_ascii=False)])
+                    _recurse({k:v}, _k, path=[*path, e2, dumps({_k:e2[_k]})])
                     _keys.append(_k)
                 else:
                     _recurse(v, e2[k], path=[*path, e2, k])
 
             _e2_items = {k:v for k,v in e2.items() if k not in {*e1, *_keys}}
             for k,v in _e2_items.items():
-                _recurse(None, v or '', path=[*path, e2, json.dumps({k:v}, ensure_ascii=False)])
+                _recurse(None, v or '', path=[*path, e2, dumps({k:v})])
             return
 
         # If compare two strings
@@ -298,12 +599,11 @@ def diff(
         if path:
             try:
                 offset, length = find(path[0], *path[-2:])
-                _s = json.dumps(path[0], ensure_ascii=False)[offset:offset+length]
             except: #  TODO: fix bare except
                 pass
 
             _d: tuple[int, int, t.Optional[str]] = tuple() # type: ignore
-            e1_dump = json.dumps(e1, ensure_ascii=False) if e1 else None
+            e1_dump = dumps(e1) if e1 else None
 
             #  TODO: more clear comments
             # If was added
@@ -313,7 +613,7 @@ def diff(
                     offset, length = find(path[0], path[-2], len(path[-2])-1)
                 elif isinstance(path[-2], dict):
                     try:
-                        _is_dict = isinstance(json.loads(path[-1]), dict)
+                        _is_dict = isinstance(loads(path[-1]), dict)
                     except json.JSONDecodeError:
                         _is_dict = False
                     if not _is_dict:
@@ -334,24 +634,354 @@ def diff(
                 _d = (offset, offset+length, None)
 
             if _d:
-                d.append(_d)
+                _check(_d, len((_d[2] or "").encode()))
 
             return
 
     _recurse(
-        e1.data if isinstance(e1, HtmlDict) else e1,
-        e2.data if isinstance(e2, HtmlDict) else e2,
+        e1.to_dict() if isinstance(e1, HtmlDict) else e1,
+        e2.to_dict() if isinstance(e2, HtmlDict) else e2,
     )
     return HtmlDiff(d, sub=e2)
 
 
-def apply_diff(html_or_str: t.Union[str, HtmlDict], diff: HtmlDiff) -> str:
-    """ Apply changes
+def spans(e: t.Any) -> dict[tuple[int, t.Union[str, int]], tuple[int, int]]:
+    """ Build node span index
+
+    Get start & end indexes of every "key": value pair in a structure dump by
+    its container id & key. Only keys are serialized, lengths of values are
+    summed up the way they are laid out by the serializer.
+
+    """
+    index: dict[tuple[int, t.Union[str, int]], tuple[int, int]] = {}
+
+    def _recurse(e: t.Any, offset: int) -> int:
+        """ Index nested pairs & return the element dump length """
+        pos: int = offset + 1
+        if isinstance(e, Mapping):
+            for k,v in e.items():
+                start = pos
+                pos += len(dumps(k)) + 2
+                pos += _recurse(v, pos)
+                index[(id(e), k)] = (start, pos)
+                pos += 2
+        elif isinstance(e, (list, tuple)):
+            for x in e:
+                pos += _recurse(x, pos) + 2
+        else:
+            return len(dumps(e))
+        # cut trailing ", " & add closing bracket or count both empty brackets
+        return (pos - 1 if e else pos + 1) - offset
+
+    _recurse(e, 0)
+    return index
+
+
+def _children(e: t.Any) -> list[tuple[Path, str]]:
+    """ Get child nodes as native path suffixes along with their keys """
+    if isinstance(e, Mapping):
+        return [((k,), k) for k in e]
+    return [((i, k), k) for i, x in enumerate(e or ()) for k in x or {}]
+
+
+def resolve(
+    e: t.Any,
+    path: t.Union[str, t.Sequence[t.Union[str, int]]]
+) -> Path:
+    """ Resolve node path
+
+    Cast XPath-like path of tags with optional 1-based positions among the same
+    tags (e.g. /html/body/div[2]/*[1]) to native path of keys & list indexes.
+    Native paths are returned as is.
+
+    """
+    if not isinstance(path, str):
+        return tuple(path)
+
+    res: list[t.Union[str, int]] = []
+    for tag, n in re.findall(r"/([^/\[]+)(?:\[(\d+)\])?", path):
+        children = [
+            (_path, k) for _path, k in _children(e)
+            if tag in ("*", k.split(" ", 1)[0])
+        ]
+        if len(children) < int(n or 1):
+            raise KeyError(path)
+        _path, k = children[int(n or 1) - 1]
+        res.extend(_path)
+        e = e[k] if len(_path) == 1 else e[_path[0]][k]
+    return tuple(res)
+
+
+def _positions(e: t.Any, path: Path) -> tuple[int, ...]:
+    """ Cast native path to positions of its keys & list indexes """
+    res: list[int] = []
+    for x in path:
+        res.append(x if isinstance(x, int) else [*e].index(x))
+        e = e[x]
+    return tuple(res)
+
+
+def _at_positions(e: t.Any, positions: t.Sequence[int]) -> Path:
+    """ Cast positions of keys & list indexes back to native path """
+    res: list[t.Union[str, int]] = []
+    for i in positions:
+        res.append(x := i if isinstance(e, (list, tuple)) else [
+            *(e if isinstance(e, Mapping) else {})
+        ][i])
+        e = e[x]
+    return tuple(res)
+
+
+def xpath(e: t.Any, path: t.Sequence[t.Union[str, int]]) -> str:
+    """ Cast native path to XPath-like one
+
+    Position is added to a tag only if there are other children with the same
+    tag, so the result can be passed back to resolve.
+
+    """
+    res: str = ""
+    i: int = 0
+    while i < len(path):
+        children = _children(e)
+        _path, k = next(
+            (x, k) for x, k in children if x == tuple(path[i:i+len(x)])
+        )
+        tag = k.split(" ", 1)[0]
+        same = [x for x, k in children if k.split(" ", 1)[0] == tag]
+        res += "/" + tag + (
+            "[%s]" % (same.index(_path) + 1) if len(same) > 1 else ""
+        )
+        e = e[_path[0]] if len(_path) == 1 else e[_path[0]][_path[1]]
+        i += len(_path)
+    return res or "/"
 
-    Restore page snapshot with source code & delta.
+
+def _walk(
+    v1: t.Any,
+    v2: t.Any,
+    path: Path = (),
+    end: t.Optional[float] = None
+) -> t.Iterator[tuple[str, Path, t.Any]]:
+    """ Walk two structures & yield structural changes
+
+    Compare dict keys & list elements by their positions the same way diff
+    does. Yield operation, path to the node & the value of the minuend one.
+
+    """
+    if end is not None and time.monotonic() >= end:
+        raise BudgetExceeded("deadline exceeded")
+
+    if isinstance(v1, Mapping) and isinstance(v2, Mapping):
+        n: int = 0
+        for n, (x1, x2) in enumerate(zip(v1.items(), v2.items()), 1):
+            if x1[0] != x2[0]: # if keys differ
+                yield "rename", (*path, x2[0]), x1
+            elif x1[1] is not x2[1]:
+                yield from _walk(x1[1], x2[1], (*path, x1[0]), end)
+        for k,v in [*v1.items()][n:]:
+            yield "add", (*path, k), v
+        for k in [*v2][n:]:
+            yield "remove", (*path, k), None
+    elif isinstance(v1, (list, tuple)) and isinstance(v2, (list, tuple)):
+        for i, (x1, x2) in enumerate(zip(v1, v2)):
+            yield from _walk(x1, x2, (*path, i), end)
+        for i, x in enumerate(v1[len(v2):], len(v2)):
+            yield "add", (*path, i), x
+        # remove from the end for indexes to remain valid
+        for i in range(len(v2) - 1, len(v1) - 1, -1):
+            yield "remove", (*path, i), None
+    elif isinstance(v1, (Mapping, list, tuple)) or isinstance(
+        v2, (Mapping, list, tuple)
+    ) or (v1 is None) != (v2 is None) or str(v1) != str(v2):
+        yield "replace", path, v1
+
+
+def _node(e: t.Any, path: t.Sequence[t.Union[str, int]]) -> t.Any:
+    """ Get node value by native path """
+    for x in path:
+        e = e[x]
+    return e
+
+
+def changes(
+    e1: t.Union[Mapping, HtmlDict],
+    e2: t.Union[Mapping, HtmlDict],
+    limit: t.Optional[int] = None
+) -> t.Iterator[tuple[str, str]]:
+    """ Get changed nodes between two HTML dicts
+
+    Walk both structures the same way diff does, but yield XPath-like paths of
+    changed nodes along with the kind of change (added, removed or replaced)
+    instead of calculating offsets. Paths of added nodes point to e1 (minuend),
+    others - to e2 (subtrahend). Empty list elements, e.g. ones of ignored tags,
+    have no tag to point to, so their parent is reported as replaced instead.
+    Stop after the limit of changes.
+
+    """
+    e1 = e1.data if isinstance(e1, HtmlDict) else e1
+    e2 = e2.data if isinstance(e2, HtmlDict) else e2
+    kinds = {"add": "added", "remove": "removed"}
+
+    def _changes() -> t.Iterator[tuple[str, str]]:
+        """ Cast structural changes to XPath-like paths """
+        last: t.Optional[tuple[str, str]] = None
+        for op, path, value in _walk(e1, e2):
+            e = e1 if op == "add" else e2
+            # list elements are addressed by their keys
+            if path and isinstance(path[-1], int):
+                if not (element := value if op == "add" else _node(e, path)):
+                    if op != "replace": # empty element has no tag - take parent
+                        if (res := (xpath(e, path[:-1]), "replaced")) != last:
+                            yield (last := res)
+                        continue
+                    e, element = e1, _node(e1, path)
+                for k in element or {}:
+                    yield xpath(e, (*path, k)), kinds.get(op, "replaced")
+            else:
+                yield xpath(e, path), kinds.get(op, "replaced")
+
+    return itertools.islice(_changes(), limit)
+
+
+def apply_patch(
+    target: t.Union[HtmlDict, dict, list, html.HtmlElement],
+    patch: HtmlPatch,
+    ignore: t.Collection = ()
+) -> t.Any:
+    """ Apply HtmlPatch in place
+
+    Change HtmlDict, its native structure or lxml tree right in place without
+    serializing it. The tree is either the one the base HtmlDict was built from
+    (pass the same ignored tags then) or the one of to_lxml. Compact HtmlDict
+    is immutable, so its structure gets rebuilt.
+
+    """
+    if isinstance(target, html.HtmlElement):
+        return _apply_lxml(target, patch, ignore=ignore)
+    if isinstance(target, HtmlDict):
+        if target._compact:
+            target.data = json2compact(
+                apply_patch(compact2json(target.data), patch)
+            )
+        else:
+            target.data = apply_patch(target.data, patch)
+        target._invalidate()
+        return target
+
+    # dict changes are postponed to rebuild it at once, as renamed keys may be
+    # swapped or match removed ones
+    pending: dict[int, tuple[dict, dict[int, tuple], set, list]] = {}
+    for op, path, value in patch:
+        value = deepcopy(value)
+        if not path:
+            target = value
+            continue
+        parent, k = _node(target, path[:-1]), path[-1]
+        if isinstance(parent, list):
+            if op == "add":
+                parent.insert(k, value)
+            elif op == "remove":
+                del parent[k]
+            else:
+                parent[k] = value
+        elif op == "replace":
+            parent[k] = value
+        else:
+            _, renamed, removed, added = pending.setdefault(
+                id(parent), (parent, {}, set(), [])
+            )
+            if op == "rename":
+                renamed[[*parent].index(k)] = tuple(value)
+            elif op == "remove":
+                removed.add(k)
+            else:
+                added.append((k, value))
+
+    for parent, renamed, removed, added in pending.values():
+        items = [
+            renamed.get(i, x) for i, x in enumerate(parent.items())
+            if x[0] not in removed
+        ]
+        parent.clear()
+        parent.update([*items, *added])
+
+    return target
+
+
+def _apply_lxml(
+    root: html.HtmlElement,
+    patch: HtmlPatch,
+    ignore: t.Collection = ()
+) -> html.HtmlElement:
+    """ Apply HtmlPatch to lxml tree in place
+
+    List indexes count every child, as lxml2json keeps {} for ignored tags &
+    comments in lists, while dict keys are looked up among the rest.
 
     """
-    s: str = str(html_or_str)
+    def _element(d: t.Mapping) -> html.HtmlElement:
+        """ Build list element or its {} placeholder """
+        return node2lxml(*[*d.items()][0]) if d else etree.Comment()
+
+    def _assign(e: html.HtmlElement, other: html.HtmlElement) -> None:
+        """ Turn element into the other one keeping it in the tree """
+        e.tag, e.text, e.tail = other.tag, other.text, other.tail
+        e.attrib.clear()
+        e.attrib.update(other.attrib)
+        e[:] = [*other]
+
+    # locate all elements first, as renamed ones can't be found by keys later
+    located: list[tuple[str, Path, t.Any, t.Any, t.Any]] = []
+    for op, path, value in patch:
+        parent: t.Optional[html.HtmlElement] = None
+        e: t.Optional[html.HtmlElement] = root
+        for i, x in enumerate(path[1:], 1):
+            if e is None: # only the last step may point to a new node
+                raise KeyError(path)
+            if isinstance(x, int):
+                parent, e = e, ([*e[x:x+1], None])[0]
+            elif not isinstance(path[i - 1], int): # list element is the key
+                parent, e = e, next((
+                    c for c in e if c.tag not in ignore and not isinstance(
+                        c, html.HtmlComment
+                    ) and get_tag(c) == x
+                ), None)
+        if e is None and op != "add":
+            raise KeyError(path)
+        located.append((op, path, parent, e, value))
+
+    for op, path, parent, e, value in located:
+        # key of a list element, which is its placeholder unless renamed
+        in_list = len(path) > 1 and isinstance(path[-2], int)
+        if op == "add" and isinstance(path[-1], int):
+            parent.append(_element(value))
+        elif op == "add":
+            new = node2lxml(str(path[-1]), value)
+            if in_list:
+                parent.replace(e, new)
+            else:
+                parent.append(new)
+        elif op == "remove" and in_list:
+            parent.replace(e, etree.Comment())
+        elif op == "remove":
+            parent.remove(e)
+            # dict left without keys is {} rather than null
+            if isinstance(path[-1], str) and not len(parent):
+                parent.append(etree.Comment())
+        elif op == "rename":
+            _assign(e, node2lxml(*value))
+        elif not path: # root replaced
+            _assign(root, node2lxml(*[*value.items()][0]))
+        elif isinstance(path[-1], int): # list element replaced
+            parent.replace(e, _element(value))
+        else:
+            e[:] = [*node2lxml(e.tag, value)]
+
+    return root
+
+
+def _apply(s: str, changes: t.Iterable[tuple[int, int, t.Optional[str]]]) -> str:
+    """ Apply changes to a structure dump in reverse order """
 
     # check if specific change is in dict scope - inside
     _in_dict: t.Callable = lambda x: _in_dict(_) if (
@@ -361,15 +991,15 @@ def apply_diff(html_or_str: t.Union[str, HtmlDict], diff: HtmlDiff) -> str:
         x.replace(" ", "").replace(",", "")
     ), ""][0].startswith("}")
 
-    for i, j, res in diff.data[::-1]:
+    for i, j, res in [*changes][::-1]:
         # when removed in update
         if (s[:i].endswith(", ") or s[i:].startswith(", ")) and res is None:
             i -= 2
         # if need to trim ", " from left (when added in update)
-        if i == j:
+        if i == j and res is not None:
             # if cur is a dict unpacked in parent structure - trim curly braces
             try:
-                if isinstance(json.loads(res), dict) and _in_dict(s[i:]):
+                if isinstance(loads(res), dict) and _in_dict(s[i:]):
                     res = res[1:-1]
             except json.JSONDecodeError:
                 pass
@@ -377,3 +1007,96 @@ def apply_diff(html_or_str: t.Union[str, HtmlDict], diff: HtmlDiff) -> str:
         s = s[:i] + (res or "") + s[j:]
 
     return s
+
+
+def apply_diff(
+    html_or_str: t.Union[str, HtmlDict],
+    diff: HtmlDiff,
+    path: t.Optional[t.Union[str, t.Sequence[t.Union[str, int]]]] = None
+) -> str:
+    """ Apply changes
+
+    Restore page snapshot with source code & delta. Pass XPath-like or native
+    path resolved on the HtmlDict to restore only its node as {"key": value}
+    dump: changes inside the node span are applied to the node dump alone,
+    otherwise the whole page gets restored first & the node is taken at the
+    same key & list positions, as its keys may have changed.
+
+    """
+    if path is None:
+        return _apply(str(html_or_str), diff.data)
+    if not isinstance(html_or_str, HtmlDict):
+        raise TypeError("HtmlDict expected to restore a node by path")
+
+    e: t.Any = html_or_str.data
+    _path = resolve(e, path)
+    if _path and isinstance(_path[-1], int): # list element is its only key
+        _path = (*_path, next(iter(_node(e, _path) or {"": None})))
+    if not _path:
+        return _apply(str(html_or_str), diff.data)
+    for x in _path[:-1]:
+        e = e[x]
+
+    if html_or_str._spans is None:
+        html_or_str._spans = spans(html_or_str.data)
+    if (span := html_or_str._spans.get((id(e), _path[-1]))) is None:
+        # node added in place after the index was built
+        raise ValueError("wrong snapshot used for applying diff")
+    start, end = span
+
+    changes: list[tuple[int, int, t.Optional[str]]] = []
+    for i, j, res in diff.data:
+        # skip changes outside & additions of siblings right after the node
+        if j < start or i > end or (i == j and i in (start, end)):
+            continue
+        # if the node is a part of a wider change - restore the whole page
+        if i < start or j > end:
+            positions = _positions(html_or_str.data, _path)
+            e = loads(_apply(str(html_or_str), diff.data))
+            try:
+                _path = _at_positions(e, positions)
+            except IndexError:
+                raise KeyError(path) from None
+            for x in _path[:-1]:
+                e = e[x]
+            return dumps({_path[-1]: e[_path[-1]]})
+        changes.append((i - start + 1, j - start + 1, res))
+
+    s = _apply(dumps({_path[-1]: e[_path[-1]]}), changes)
+    if s == "{}":
+        raise KeyError(path)
+    return s
+
+
+def encode_version(
+    base: HtmlDict,
+    new: HtmlDict,
+    max_changes: t.Optional[int] = None,
+    max_delta_bytes: t.Optional[int] = None,
+    deadline: t.Optional[float] = None
+) -> t.Union[HtmlDiff, HtmlDict]:
+    """ Encode new snapshot as delta or as full snapshot
+
+    Get delta against the base one within the budget & fall back to the new
+    snapshot itself if the budget is exceeded. Delta can't take more UTF-8
+    bytes than the new snapshot dump by default.
+
+    """
+    try:
+        return t.cast(HtmlDiff, new.subtract(
+            base,
+            max_changes=max_changes,
+            max_delta_bytes=len(str(new).encode()) if max_delta_bytes is None
+            else max_delta_bytes,
+            deadline=deadline
+        ))
+    except BudgetExceeded:
+        return new
+
+
+def decode_version(
+    base: HtmlDict,
+    version: t.Union[HtmlDiff, HtmlDict]
+) -> HtmlDict:
+    """ Decode snapshot encoded with encode_version """
+    return base + version if isinstance(version, HtmlDiff) else version
@@ -1,27 +1,93 @@
-import json
+import codecs
 import re
+import sys
 import typing as t
+from collections.abc import ItemsView, Mapping, ValuesView
 from enum import Enum
+from itertools import repeat
+from html import unescape
 from warnings import warn
 
 from lxml import etree, html
 
+from diff4html.serializer import dumps, loads
+
 Struct = t.Union[dict, list, tuple]
 
 
-def prepare(s: str) -> str:
-    """ Prepare HMTL source string
-    
-    Remove all new lines, empty attribute values & redundant spaces.
+Source = t.Union[str, bytes, bytearray, memoryview]
+
+BOMS: tuple[tuple[bytes, str], ...] = (
+    (codecs.BOM_UTF8, "UTF-8"),
+    (codecs.BOM_UTF32_LE, "UTF-32LE"),
+    (codecs.BOM_UTF32_BE, "UTF-32BE"),
+    (codecs.BOM_UTF16_LE, "UTF-16LE"),
+    (codecs.BOM_UTF16_BE, "UTF-16BE"),
+)
+""" Byte order marks to detect encoding by, UTF-32 ones go before UTF-16 """
+
+
+def detect_encoding(b: t.Union[bytes, bytearray, memoryview]) -> tuple[str, int]:
+    """ Detect HTML source encoding
+
+    Look for a byte order mark first & then for a meta charset declaration
+    within the first 1024 bytes. Fall back to UTF-8 if none found or encoding is
+    unknown. Return encoding label along with the BOM length to skip.
 
     """
-    # remove new lines, empty attribute values & gaps between tags
-    s = re.sub(r"\>[\ ]*\<", "><", s.replace('\n', '').replace('=""', ''))
+    head = bytes(b[:1024])
+    for bom, encoding in BOMS:
+        if head.startswith(bom):
+            return encoding, len(bom)
+    if m := re.search(
+        rb"""<meta[^>]+charset\s*=\s*["']?\s*([\w:.-]+)""", head, re.I
+    ):
+        try:
+            codecs.lookup(encoding := m.group(1).decode("ascii"))
+            return encoding, 0
+        except LookupError:
+            pass
+    return "UTF-8", 0
+
+
+def prepare(s: Source) -> html.HtmlElement:
+    """ Prepare HMTL source
+
+    Parse source str or bytes-like object with comments removed. Then remove
+    all new lines from texts, tails & attribute values along with texts & tails
+    made of spaces only right on the parsed tree.
 
-    return html.tostring(
-        html.fromstring(s, parser=etree.HTMLParser(remove_comments=True)),
-        encoding='unicode'
-    )
+    """
+    parser: html.HTMLParser = html.HTMLParser(remove_comments=True)
+    if not isinstance(s, str):
+        encoding, skip = detect_encoding(s)
+        s = memoryview(s)[skip:]
+        try:
+            parser = html.HTMLParser(remove_comments=True, encoding=encoding)
+        except LookupError: # label is known to Python but not to libxml2
+            s = codecs.decode(s, encoding)
+        # fragments are handled by fromstring which can't check memoryview
+        if isinstance(s, memoryview) and not re.match(
+            r"\s*<(?:html|!doctype)",
+            codecs.decode(s[:256], encoding, "ignore"),
+            re.I
+        ):
+            s = bytes(s)
+
+    e: html.HtmlElement = etree.fromstring(s, parser) if isinstance(
+        s, memoryview
+    ) else html.fromstring(s, parser=parser)
+
+    for x in e.iter(etree.Element):
+        for k,v in x.attrib.items():
+            if "\n" in v:
+                x.attrib[k] = v.replace("\n", "")
+        if x.text is not None:
+            x.text = _ if (_ := x.text.replace("\n", "")).strip(" ") else None
+        if x.tail is not None:
+            x.tail = _ if (_ := x.tail.replace("\n", "")).strip(" ") else None
+
+    return e
 
 
 def get_tag(e: html.HtmlElement, f: t.Callable = lambda x: True) -> t.Optional[str]:
@@ -49,10 +115,10 @@ def get_tag(e: html.HtmlElement, f: t.Callable = lambda x: True) -> t.Optional[s
         else:
             attrs.append(str(k))
     s = e.tag + (" " if attrs else "") + " ".join(attrs)
-    return s
+    return sys.intern(s)
 
 
-def lxml2json(html_or_str: t.Union[html.HtmlElement, str], ignore = ()) -> dict:
+def lxml2json(html_or_str: t.Union[html.HtmlElement, Source], ignore = ()) -> dict:
     """ Cast lxml HtmlElement tree to JSON 
 
     Recursively convert lxml structure into JSON formed one. Pass ignore set to 
@@ -61,11 +127,12 @@ def lxml2json(html_or_str: t.Union[html.HtmlElement, str], ignore = ()) -> dict:
     """
     def _recurse(e: html.HtmlElement) -> dict:
         e_data: Struct
-        e_name = get_tag(e)
 
         if e.tag in ignore or isinstance(e, html.HtmlComment):
             return {}
 
+        e_name = get_tag(e)
+
         if not (children := e.getchildren()):
             return {e_name: None}
 
@@ -89,13 +156,123 @@ def lxml2json(html_or_str: t.Union[html.HtmlElement, str], ignore = ()) -> dict:
 
 
     return _recurse(
-        html_or_str if isinstance(html_or_str, html.HtmlElement) else html.fromstring(
-            prepare(html_or_str)
+        html_or_str if isinstance(html_or_str, html.HtmlElement) else prepare(
+            html_or_str
         )
     )
 
 
-def json2lxml(d: t.Union[str, Struct]) -> html.HtmlElement:
+INDEX_WIDTH: int = 8
+""" Number of keys above which HtmlNode looks them up by index """
+
+
+class HtmlNode(Mapping):
+    """ HtmlNode
+
+    Immutable memory-efficient counterpart of a dict node. Keys are interned
+    strings shared through the process-wide table of sys.intern, child lists are
+    stored as tuples & values of a node whose children are all leaves (None) are
+    collapsed to a single None.
+
+    """
+
+    __slots__ = ("_keys", "_values", "_index")
+
+    _keys: tuple[str, ...]
+    """ Interned tag strings """
+
+    _values: t.Optional[tuple]
+    """ Child values or None if all of them are None """
+
+    _index: t.Optional[dict[str, int]]
+    """ Key positions built on the first lookup in a wide node """
+
+    def __init__(self, keys: tuple[str, ...], values: t.Optional[tuple] = None):
+        self._keys = keys
+        self._values = values
+        self._index = None
+
+    def __getitem__(self, key: str) -> t.Any:
+        try:
+            if len(self._keys) <= INDEX_WIDTH:
+                i = self._keys.index(key)
+            else:
+                if self._index is None:
+                    self._index = {k: i for i, k in enumerate(self._keys)}
+                i = self._index[key]
+        except (KeyError, ValueError):
+            raise KeyError(key) from None
+        return None if self._values is None else self._values[i]
+
+    def __iter__(self) -> t.Iterator[str]:
+        return iter(self._keys)
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def __repr__(self) -> str:
+        return "%s(%s)" % (self.__class__.__name__, dict(self.items()))
+
+    def _asdict(self) -> dict:
+        """ Get single level dict, e.g. for serialization """
+        return dict(zip(self._keys, self._values or repeat(None)))
+
+    def items(self) -> ItemsView:
+        return _NodeItems(self)
+
+    def values(self) -> ValuesView:
+        return _NodeValues(self)
+
+
+class _NodeItems(ItemsView):
+    """ HtmlNode items iterated without key lookups """
+
+    _mapping: HtmlNode
+
+    def __iter__(self) -> t.Iterator[tuple[str, t.Any]]:
+        node = self._mapping
+        return zip(node._keys, node._values or repeat(None))
+
+
+class _NodeValues(ValuesView):
+    """ HtmlNode values iterated without key lookups """
+
+    _mapping: HtmlNode
+
+    def __iter__(self) -> t.Iterator[t.Any]:
+        node = self._mapping
+        return iter(node._values or repeat(None, len(node._keys)))
+
+
+def json2compact(d: t.Any) -> t.Any:
+    """ Cast JSON structure to compact one
+
+    Recursively replace dicts with HtmlNode & lists with tuples.
+
+    """
+    if isinstance(d, HtmlNode):
+        return d
+    if isinstance(d, dict):
+        values = tuple(json2compact(x) for x in d.values())
+        return HtmlNode(
+            tuple(sys.intern(x) for x in d),
+            None if all(x is None for x in values) else values
+        )
+    if isinstance(d, (list, tuple)):
+        return tuple(json2compact(x) for x in d)
+    return d
+
+
+def compact2json(d: t.Any) -> t.Any:
+    """ Cast compact structure back to JSON one """
+    if isinstance(d, Mapping):
+        return {k: compact2json(v) for k,v in d.items()}
+    if isinstance(d, (list, tuple)):
+        return [compact2json(x) for x in d]
+    return d
+
+
+def json2lxml(d: t.Union[str, Struct, HtmlNode]) -> html.HtmlElement:
     """ Cast JSON to lxml HtmlElement tree
     
     Recursively cast JSON structure to HTML-like string & pass it to fromstring 
@@ -132,9 +309,7 @@ def json2lxml(d: t.Union[str, Struct]) -> html.HtmlElement:
         return res
 
     # if given dict - serialize it in str dump first
-    s: str = json.dumps(
-        d, ensure_ascii=False
-    ) if isinstance(d, Struct) else d # type: ignore
+    s: str = d if isinstance(d, str) else dumps(d)
 
     # return back all doublequotes (were replaced with backtick)
     for x in sorted(re.findall(r"([^\ =]+\=\`[^\`]*\`)", s), reverse=True):
@@ -145,18 +320,58 @@ def json2lxml(d: t.Union[str, Struct]) -> html.HtmlElement:
                 continue
             s = s.replace(x, x.replace('`', '\\"'))
 
-    return html.fromstring(_recurse(json.loads(s)))
+    return html.fromstring(_recurse(loads(s)))
+
 
+def node2lxml(key: str, value: t.Any) -> html.HtmlElement:
+    """ Cast a single JSON node to lxml HtmlElement
 
-def validate(s: str) -> bool:
+    Build the element right from its tag string & value without serializing it
+    in HTML, so any element can be built out of its parent context. Empty list
+    elements & the only child of an empty dict become empty comments.
+
+    """
+    tag, _, attrs = key.partition(" ")
+    e: html.HtmlElement = html.Element(tag)
+    for k,v in re.findall(r"([^\s=]+)(?:=\`([^\`]*)\`)?", attrs):
+        v = unescape(v)
+        if k == "__text__":
+            e.text = v
+        elif k == "__tail__":
+            e.tail = v
+        elif k != "__pref__":
+            e.set(k, v)
+
+    if isinstance(value, Mapping):
+        # children of an empty dict were all ignored, so keep one as comment
+        e.extend([node2lxml(k, v) for k,v in value.items()] or [
+            etree.Comment()
+        ])
+    elif isinstance(value, (list, tuple)):
+        # keep empty list elements as comments, as lxml2json casts them to {}
+        e.extend(
+            node2lxml(*[*x.items()][0]) if x else etree.Comment()
+            for x in value
+        )
+    return e
+
+
+def validate(
+    html_or_str: t.Union[html.HtmlElement, Source],
+    d: t.Optional[dict] = None
+) -> bool:
     """ Validate HTML source 
 
     Check if page code after lxml2json & json2lxml steps will return the same 
-    lxml representation as if it was processed by lxml only.
+    lxml representation as if it was processed by lxml only. Pass prepared tree
+    & its JSON structure to skip parsing & casting them once again.
 
     """
+    e = html_or_str if isinstance(html_or_str, html.HtmlElement) else prepare(
+        html_or_str
+    )
     _ = lambda x: html.tostring(x, encoding='unicode')
-    return _(json2lxml(lxml2json(s))) == _(html.fromstring(prepare(s))) or warn(
+    return _(json2lxml(lxml2json(e) if d is None else d)) == _(e) or warn(
         "the result of converting the received object " + \
         "back to lxml object does not match the source one"
     ) or False
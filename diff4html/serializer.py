@@ -0,0 +1,134 @@
+import json
+import typing as t
+from collections.abc import Mapping
+
+try:
+    import orjson
+except ImportError: # orjson is not installed
+    orjson = None # type: ignore
+
+try:
+    import msgspec
+except ImportError: # msgspec is not installed
+    msgspec = None # type: ignore
+
+
+def unfold(o: t.Any) -> dict:
+    """ Unfold single mapping level, e.g. for HtmlNode on serialization """
+    if (asdict := getattr(o, "_asdict", None)) is not None: # skip ABC check
+        return asdict()
+    if isinstance(o, Mapping):
+        return dict(o.items())
+    raise TypeError(
+        "Object of type %s is not JSON serializable" % o.__class__.__name__
+    )
+
+
+def canonize(b: bytes) -> bytes:
+    """ Canonize compact JSON dump
+
+    Add spaces after item & key separators the same way json.dumps does. Only
+    parts outside of string literals are touched, so the dump must not contain
+    escaped doublequotes. Works on UTF-8 bytes, as splitting them is about twice
+    as fast as splitting decoded str.
+
+    """
+    parts = b.split(b'"')
+    # every even part is outside of string literals & consists of punctuation
+    parts[::2] = b"\0".join(parts[::2]).replace(b",", b", ").replace(
+        b":", b": "
+    ).split(b"\0")
+    return b'"'.join(parts)
+
+
+class Serializer:
+    """ Serializer
+
+    Standard library JSON backend. Every backend has to produce exactly the
+    same dump as json.dumps with ensure_ascii=False does, because HtmlDiff
+    offsets point to this very layout.
+
+    """
+
+    name: str = "json"
+    """ Backend name """
+
+    def dumps(self, o: t.Any) -> str:
+        """ Serialize to canonical JSON dump """
+        return json.dumps(o, ensure_ascii=False, default=unfold)
+
+    def loads(self, s: t.Union[str, bytes]) -> t.Any:
+        """ Deserialize JSON dump """
+        return json.loads(s)
+
+
+class OrjsonSerializer(Serializer):
+    """ orjson backend """
+
+    name: str = "orjson"
+
+    def dumps(self, o: t.Any) -> str:
+        try:
+            b = orjson.dumps(o, default=unfold)
+        except TypeError: # e.g. non-str keys, lone surrogates or big integers
+            return super().dumps(o)
+        # strings with escaped doublequotes can't be canonized in place
+        return super().dumps(o) if b'\\"' in b else canonize(b).decode()
+
+    def loads(self, s: t.Union[str, bytes]) -> t.Any:
+        return orjson.loads(s)
+
+
+class MsgspecSerializer(Serializer):
+    """ msgspec backend """
+
+    name: str = "msgspec"
+
+    def __init__(self):
+        self._encoder = msgspec.json.Encoder(enc_hook=unfold)
+        self._decoder = msgspec.json.Decoder()
+
+    def dumps(self, o: t.Any) -> str:
+        try:
+            b = self._encoder.encode(o)
+        except (TypeError, UnicodeEncodeError, msgspec.EncodeError):
+            return super().dumps(o)
+        return super().dumps(o) if b'\\"' in b else canonize(b).decode()
+
+    def loads(self, s: t.Union[str, bytes]) -> t.Any:
+        try:
+            return self._decoder.decode(s)
+        except msgspec.DecodeError as e:
+            raise json.JSONDecodeError(str(e), str(s), 0) from e
+
+
+BACKENDS: dict[str, type[Serializer]] = {
+    **({"orjson": OrjsonSerializer} if orjson else {}),
+    **({"msgspec": MsgspecSerializer} if msgspec else {}),
+    "json": Serializer,
+}
+""" Available backends in the order of preference """
+
+serializer: Serializer = [*BACKENDS.values()][0]()
+""" Backend currently in use """
+
+
+def use(name: str) -> Serializer:
+    """ Switch serializer backend """
+    global serializer # pylint: disable=global-statement
+    if name not in BACKENDS:
+        raise ValueError(
+            "unknown or not installed serializer backend: '%s'" % name
+        )
+    serializer = BACKENDS[name]()
+    return serializer
+
+
+def dumps(o: t.Any) -> str:
+    """ Serialize to canonical JSON dump with the current backend """
+    return serializer.dumps(o)
+
+
+def loads(s: t.Union[str, bytes]) -> t.Any:
+    """ Deserialize JSON dump with the current backend """
+    return serializer.loads(s)
@@ -22,10 +22,18 @@ setup(
     packages=find_packages(exclude=["tests", "tests.*"]),
     package_data={"": ["examples/**"]},
     python_requires=">=3.11",
+    entry_points={
+        "console_scripts": [
+            "diff4html=diff4html.cli:main",
+        ],
+    },
     install_requires=[
         "lxml==5.3.1",
     ],
     extras_require={
+        "fast": [
+            "orjson",
+        ],
         "dev": [
             "mypy",
             "pylint",
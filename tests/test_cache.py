@@ -0,0 +1,92 @@
+import typing as t
+
+import pytest
+
+from diff4html import HtmlDict, cache
+from diff4html.diff import BudgetExceeded, apply_patch, encode_version
+
+PAGES: list[bytes] = [
+    b"<html><body><div>%s</div></body></html>" % x for x in (b"1", b"2")
+]
+""" Pages with different texts """
+
+
+@pytest.fixture
+def lru() -> t.Iterator[cache.LRUCache]:
+    """ Enable process-wide cache for a test & disable it afterwards """
+    yield cache.enable(maxsize=8)
+    cache.disable()
+
+
+# check if the same source gets parsed only once
+def test_cached(lru):
+    page = HtmlDict.cached(PAGES[0])
+    assert HtmlDict.cached(bytearray(PAGES[0])) is page
+    assert HtmlDict.cached(PAGES[0].decode()) is not page
+    assert HtmlDict.cached(PAGES[0], compact=True) is not page
+    assert HtmlDict.cached(PAGES[0], ignore=["div"]) is not page
+    assert lru.info()[:4] == (1, 4, 8, 4)
+
+
+# check if str & bytes sources are cached apart as they are decoded apart
+def test_cached_charset(lru):
+    source = '<html><head><meta charset="windows-1251"></head><body>Привет'
+    HtmlDict.cached(source)
+    page = HtmlDict.cached(source.encode())
+    assert str(page) == str(HtmlDict(source.encode()))
+    assert "Привет" not in str(page)
+
+
+# check if object changed in place gets evicted from the cache
+def test_cached_patched(lru):
+    pages = [HtmlDict.cached(x) for x in PAGES]
+    patch = pages[1].subtract(pages[0], structural=True)
+    assert apply_patch(pages[0], patch) == pages[1]
+    assert HtmlDict.cached(PAGES[0]) == HtmlDict(PAGES[0])
+    page, info = HtmlDict.cached(PAGES[0]), lru.info()
+    page["html"] = None
+    assert HtmlDict.cached(PAGES[0]) is not page
+    assert lru.info()[3:] == info[3:]
+
+
+# check if diff of the same snapshots gets calculated only once
+def test_cached_diff(lru):
+    pages = [HtmlDict.cached(x) for x in PAGES]
+    d = pages[1] - pages[0]
+    assert pages[1] - pages[0] is d
+    assert pages[0] + d == pages[1]
+    assert HtmlDict(PAGES[1]) - HtmlDict(PAGES[0]) is not d
+
+
+# check if memoized diff still has to fit the budget
+@pytest.mark.parametrize("structural", [False, True])
+def test_cached_diff_budget(lru, structural):
+    pages = [HtmlDict.cached(x) for x in PAGES]
+    d = pages[1].subtract(pages[0], structural=structural)
+    for budget in ({"max_changes": 0}, {"max_delta_bytes": 1}):
+        with pytest.raises(BudgetExceeded):
+            pages[1].subtract(pages[0], structural=structural, **budget)
+    assert pages[1].subtract(
+        pages[0], max_changes=1, structural=structural
+    ) is d
+    assert encode_version(pages[0], pages[1], max_changes=0) is pages[1]
+
+
+# check if the least recently used entries get evicted
+def test_eviction():
+    lru = cache.LRUCache(maxsize=2, maxbytes=100)
+    lru.put(1, "a", size=40)
+    lru.put(2, "b", size=40)
+    assert lru.get(1) == "a"
+    lru.put(3, "c", size=40) # evicts 2 by size
+    assert 2 not in lru and 1 in lru
+    lru.put(4, "d", size=10) # evicts 1 by count
+    assert 1 not in lru and len(lru) == 2
+    lru.put(5, "e", size=101) # doesn't fit at all
+    assert 5 not in lru
+    assert lru.info() == (1, 0, 2, 2, 100, 50)
+
+
+# check if disabled cache doesn't keep objects
+def test_disabled():
+    assert HtmlDict.cached(PAGES[0]) is not HtmlDict.cached(PAGES[0])
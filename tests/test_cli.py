@@ -0,0 +1,100 @@
+import typing as t
+
+import pytest
+
+from diff4html import HtmlDict
+from diff4html.cli import main
+from diff4html.serializer import loads
+
+PAGES: list[tuple[str, str]] = [
+    (
+        "<html><body><div><p>%s</p><b>x</b></div></body></html>" % i,
+        "<html><body><div><p>%s!</p><b>x</b></div></body></html>" % i,
+    ) for i in range(4)
+]
+""" Base & new pages with different texts """
+
+
+@pytest.fixture
+def corpus(tmp_path, monkeypatch) -> t.Iterator[str]:
+    """ Make base & new snapshot directories in the working one """
+    monkeypatch.chdir(tmp_path)
+    for i, pages in enumerate(PAGES):
+        for d, page in zip(("base", "new"), pages):
+            (tmp_path / d / str(i % 2)).mkdir(parents=True, exist_ok=True)
+            (tmp_path / d / str(i % 2) / ("%s.html" % i)).write_text(page)
+    (tmp_path / "base" / "unmatched.html").write_text(PAGES[0][0])
+    yield str(tmp_path)
+
+
+# check if pairs get diffed & restored back with any number of workers
+@pytest.mark.parametrize("fmt", ["jsonl", "bin"])
+@pytest.mark.parametrize("workers", ["1", "2"])
+def test_diff_apply(corpus, capsys, fmt, workers):
+    assert main([
+        "diff", "base", "new", "-o", "deltas", "-f", fmt, "-w", workers
+    ]) == 0
+    assert "4 pages (0 failed" in capsys.readouterr().err
+    assert main(["apply", "deltas", "-d", "out", "-f", fmt, "-w", workers]) == 0
+    for i, (_, page) in enumerate(PAGES):
+        assert HtmlDict(
+            open("out/%s/%s.html" % (i % 2, i)).read()
+        ) == HtmlDict(page)
+
+
+# check if pairs get read from manifest & nodes restored partially
+def test_manifest(corpus, capsys, monkeypatch):
+    with open("manifest.jsonl", "w") as f:
+        f.write('{"id": "p", "base": "base/0/0.html", "new": "new/0/0.html"}')
+    assert main(["diff", "manifest.jsonl", "-o", "deltas"]) == 0
+    monkeypatch.chdir("new") # base paths are kept absolute
+    assert main(["restore", "../deltas", "--xpath", "/html/body/div/p"]) == 0
+    assert loads(capsys.readouterr().out) == {
+        "id": "p", "snapshot": {"p __text__=`0!`": None}
+    }
+
+
+# check if failures are reported in records & exit code
+def test_failed(corpus, capsys):
+    with open("deltas", "w") as f:
+        f.write('{"id": "p", "error": "KeyError"}\n')
+        f.write('{"id": "q", "base": "new/0/0.html", "digest": "", "ignore": []}')
+    assert main(["apply", "deltas"]) == 1
+    out, err = capsys.readouterr()
+    assert [loads(x)["id"] for x in out.splitlines()] == ["p", "q"]
+    assert "wrong snapshot" in out and "2 failed" in err
+
+
+# check if restored files never get written outside of output directory
+def test_apply_destination(corpus, capsys):
+    with open("manifest.jsonl", "w") as f:
+        f.write('{"base": "%s/base/0/0.html", "new": "%s/new/0/0.html"}' % (
+            corpus, corpus
+        ))
+    assert main(["diff", "manifest.jsonl", "-o", "deltas"]) == 0
+    assert main(["apply", "deltas", "-d", "out"]) == 0
+    assert "bytes out: 0.0 B" not in capsys.readouterr().err
+    assert open("out/%s/new/0/0.html" % corpus.lstrip("/")).read() == (
+        PAGES[0][1]
+    )
+    assert open("new/0/0.html").read() == PAGES[0][1]
+
+    with open("deltas", "w") as f:
+        f.write('{"id": "../0.html", "base": "base/0/0.html"}')
+    assert main(["apply", "deltas", "-d", "out"]) == 1
+    assert "escapes output directory" in capsys.readouterr().out
+
+
+# check if wrong number of workers is rejected by parser
+def test_workers(corpus):
+    with pytest.raises(SystemExit):
+        main(["diff", "base", "new", "-w", "-1"])
+
+
+# check if corpus gets profiled with full snapshot fallback
+def test_bench(corpus, capsys):
+    assert main(["bench", "base", "new", "--max-changes", "0"]) == 0
+    err = capsys.readouterr().err
+    assert "1 files without a pair skipped" in err
+    assert "4 pages (0 failed, 4 full snapshots)" in err
+    assert "cpu time: parse" in err
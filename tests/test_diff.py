@@ -0,0 +1,225 @@
+import typing as t
+from collections.abc import Mapping
+
+import pytest
+from lxml import html
+
+from diff4html import HtmlDict
+from diff4html.diff import (
+    BudgetExceeded, HtmlDiff, HtmlPatch, apply_patch, decode_version,
+    encode_version, resolve, spans
+)
+from diff4html.html import lxml2json, prepare
+from diff4html.serializer import dumps
+
+PAGES: list[str] = [
+    "<html><body>%s</body></html>" % "".join(
+        '<div class="card"><h2>%s</h2><ul>%s</ul><p>%s</p></div>' % x
+        for x in cards
+    ) for cards in [[
+        ("A", "<li>1</li><li>1</li><li>1</li>", "a"),
+        ("B", "<li>1</li><li>1</li><li>1</li>", "b"),
+        ("C", "<li>1</li><li>1</li><li>1</li>", "c"),
+    ], [
+        ("A", "<li>1</li><li>1</li><li>1</li>", "a"),
+        ("B!", "<li>1</li><li>2</li><li>1</li>", "b"),
+        ("C", "<li>1</li><li>1</li><li>1</li>", "c!"),
+    ]]
+]
+""" Pages with repeated cards: the 2nd and the 3rd ones differ """
+
+
+# check if every pair span points to its dump
+def test_spans():
+    page = HtmlDict(PAGES[0])
+    index, s = spans(page.data), str(page)
+
+    def _recurse(e: t.Any) -> None:
+        if isinstance(e, Mapping):
+            for k,v in e.items():
+                start, end = index[(id(e), k)]
+                assert s[start:end] == dumps({k: v})[1:-1]
+                _recurse(v)
+        elif isinstance(e, list):
+            for x in e:
+                _recurse(x)
+
+    _recurse(page.data)
+
+
+# check if a single node gets restored the same way as the whole page
+@pytest.mark.parametrize("path", [
+    "/html",
+    "/html/body/div[1]",
+    "/html/body/div[2]",
+    "/html/body/div[2]/h2",
+    "/html/body/div[2]/ul/li[2]",
+    "/html/body/div[3]/*[3]",
+    ("html", "body", 0, "div class=`card`"),
+], ids=str)
+@pytest.mark.parametrize("compact", [False, True])
+def test_restore_subtree(path, compact):
+    pages = [HtmlDict(x, compact=compact) for x in PAGES]
+    page = pages[0] + (d := pages[1] - pages[0])
+    e = page.data
+    for x in (_path := resolve(e, path)):
+        e = e[x]
+
+    node = pages[0].restore_subtree(d, path)
+    assert dumps(node.data) == dumps({_path[-1]: e})
+
+
+# check if repeated partial restores don't dump the whole page again
+def test_restore_subtree_repeated(monkeypatch):
+    pages = [HtmlDict(x) for x in PAGES]
+    d = pages[1] - pages[0]
+    pages[0].restore_subtree(d, "/html/body/div[2]/h2")
+    monkeypatch.setattr(HtmlDict, "__str__", lambda self: pytest.fail())
+    node = pages[0].restore_subtree(d, "/html/body/div[3]/p")
+    assert dumps(node.data) == '{"p __text__=`c!`": null}'
+
+
+# check if node inside a wider change is taken at the same positions
+@pytest.mark.parametrize("path", [
+    ("html", "body", "div class=`a`", "p __text__=`1`"),
+    "/html/body/div/p",
+])
+def test_restore_subtree_wider_change(path):
+    pages = [HtmlDict(
+        '<html><body><div class="%s"><p>1</p><b>2</b></div></body></html>' % x
+    ) for x in "ab"]
+    node = pages[0].restore_subtree(pages[1] - pages[0], path)
+    assert dumps(node.data) == '{"p __text__=`1`": null}'
+
+
+# check if snapshot changed in place since the first restore is rejected
+def test_restore_subtree_changed():
+    pages = [HtmlDict(x) for x in PAGES]
+    d = pages[1] - pages[0]
+    pages[0].restore_subtree(d, "/html/body/div[2]/h2")
+    pages[0]["html"]["body"][1]["div class=`card`"]["i"] = None
+    with pytest.raises(ValueError):
+        pages[0].restore_subtree(d, "/html/body/div[2]/i")
+    pages[0]["html"] = {"body": None}
+    with pytest.raises(ValueError):
+        pages[0].restore_subtree(d, "/html/body")
+
+
+# check if a node can't be restored with delta of another snapshot
+def test_restore_subtree_wrong_snapshot():
+    pages = [HtmlDict(x) for x in PAGES]
+    with pytest.raises(ValueError):
+        pages[1].restore_subtree(pages[1] - pages[0], "/html/body")
+    with pytest.raises(KeyError):
+        pages[0].restore_subtree(pages[1] - pages[0], "/html/body/div[4]")
+
+
+# check if changed nodes are found without offsets
+@pytest.mark.parametrize("compact", [False, True])
+def test_changed_paths(compact):
+    pages = [HtmlDict(x, compact=compact) for x in [
+        *PAGES, PAGES[1].replace("</body>", "<footer></footer></body>")
+    ]]
+    assert [*pages[0].changed_paths(pages[0])] == []
+    assert [*pages[2].changed_paths(pages[0])] == [
+        ("/html/body/div[2]/h2", "replaced"),
+        ("/html/body/div[2]/ul/li[2]", "replaced"),
+        ("/html/body/div[3]/p", "replaced"),
+        ("/html/body/footer", "added"),
+    ]
+    assert [*pages[0].changed_paths(pages[2], limit=1)] == [
+        ("/html/body/div[2]/h2", "replaced"),
+    ]
+    assert [*pages[1].changed_paths(pages[2])][-1] == (
+        "/html/body/footer", "removed"
+    )
+
+
+# check if changes of ignored list elements are reported by their parent
+def test_changed_paths_ignore():
+    pages = [HtmlDict(x, ignore=("script",)) for x in [
+        "<div><p>1</p><p>1</p></div>",
+        "<div><p>1</p><p>1</p><script></script><script></script></div>",
+    ]]
+    assert [*pages[0].changed_paths(pages[1])] == [("/div", "replaced")]
+    assert [*pages[1].changed_paths(pages[0])] == [("/div", "replaced")]
+
+
+# check if diff gets aborted as soon as it runs out of budget
+@pytest.mark.parametrize("budget", [
+    {"max_changes": 2},
+    {"max_delta_bytes": 40},
+    {"deadline": 0},
+], ids=str)
+def test_budget(budget):
+    pages = [HtmlDict(x) for x in PAGES]
+    with pytest.raises(BudgetExceeded):
+        pages[1].subtract(pages[0], **budget)
+    assert isinstance(encode_version(pages[0], pages[1], **budget), HtmlDict)
+    assert decode_version(pages[0], encode_version(pages[0], pages[1])) == (
+        pages[1]
+    )
+    assert isinstance(encode_version(pages[0], pages[1]), HtmlDiff)
+
+
+# check if delta size is measured in UTF-8 bytes rather than characters
+@pytest.mark.parametrize("structural", [False, True])
+def test_budget_bytes(structural):
+    pages = [HtmlDict("<div><p>%s</p></div>" % x) for x in ("1", "Привет")]
+    d = pages[1].subtract(pages[0], structural=structural)
+    size = sum(
+        len((dumps(x[2]) if structural else x[2] or "").encode()) for x in d
+    )
+    pages[1].subtract(pages[0], max_delta_bytes=size, structural=structural)
+    with pytest.raises(BudgetExceeded):
+        pages[1].subtract(
+            pages[0], max_delta_bytes=size - 1, structural=structural
+        )
+
+
+# check if structural patch is applied in place to dicts & lxml trees
+@pytest.mark.parametrize("pages", [PAGES, [
+    "<div><p>1</p><b>2</b></div>", "<div><b>2</b><p>1</p></div>"
+], [
+    "<div><p>1</p></div>", "<div><p>1</p><p>1</p><b>2</b></div>"
+], [
+    "<div><p>1</p><p>1</p><p>1</p><i>3</i></div>", "<div><p>1</p><p>1</p></div>"
+]], ids=["cards", "swap", "grow", "shrink"])
+@pytest.mark.parametrize("compact", [False, True])
+def test_patch(pages, compact):
+    base, new = [HtmlDict(x, compact=compact) for x in pages]
+    patch = new.subtract(base, structural=True)
+    assert isinstance(patch, HtmlPatch)
+    assert base + patch == new
+    assert str(base) == str(HtmlDict(pages[0])) # base is left untouched
+    assert html.tostring(apply_patch(base.to_lxml(), patch)) == (
+        html.tostring(new.to_lxml())
+    )
+    assert base + patch.to_diff(base) == new
+    assert HtmlPatch.from_diff(base, new - base) == patch
+
+
+# check if patch is applied to source tree that still has ignored tags
+@pytest.mark.parametrize("pages", [[
+    "<div><script></script><p>1</p><p>1</p><b>3</b></div>",
+    "<div><script></script><p>1</p><p>1</p><b>4</b></div>"
+], [
+    "<div><p>1</p><script></script><p>1</p></div>",
+    "<div><p>1</p><script></script><p>2</p></div>"
+], [
+    "<div><p>1</p><p>1</p><div><i>1</i></div></div>",
+    "<div><script></script><p>1</p><div><script></script></div></div>"
+]], ids=["shifted", "between", "emptied"])
+def test_patch_ignore(pages):
+    base, new = [HtmlDict(x, ignore=("script",)) for x in pages]
+    patch = new.subtract(base, structural=True)
+    tree = apply_patch(prepare(pages[0]), patch, ignore=("script",))
+    assert lxml2json(tree, ignore=("script",)) == new.data
+
+
+# check if patch raises KeyError for lxml tree missing its nodes
+def test_patch_missing():
+    base, new = [HtmlDict(x) for x in PAGES]
+    patch = new.subtract(base, structural=True)
+    with pytest.raises(KeyError):
+        apply_patch(prepare("<html><body></body></html>"), patch)
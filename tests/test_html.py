@@ -1,3 +1,5 @@
+import json
+import tracemalloc
 import typing as t
 from dataclasses import dataclass, field
 
@@ -5,7 +7,10 @@ import pytest
 import requests
 from lxml import html
 
-from diff4html.html import get_tag, validate
+from diff4html.html import (
+    compact2json, get_tag, json2compact, lxml2json, prepare, validate
+)
+from diff4html.serializer import unfold
 
 
 @dataclass
@@ -63,3 +68,102 @@ def test_html_cast(case):
     r = requests.get(case.sub, timeout=60)
     r.raise_for_status()
     assert validate(r.text)
+
+
+# check if compact structure dumps & casts back the same way as the JSON one
+@pytest.mark.parametrize("case", [
+    Test(x, f"<html>{y}</html>", None) for x,y in [(
+        "basic_empty",
+        '<body></body>'
+    ), (
+        "basic_dict",
+        '<body><div class="1">2</div><p></p></body>'
+    ), (
+        "basic_list",
+        '<body><ul><li>1</li><li>1</li></ul><ul><li>1</li><li>2</li></ul></body>'
+    ), (
+        "ignored_tags",
+        '<body><script>1</script><div><script>2</script></div></body>'
+    )]
+], ids=lambda x: x.id)
+def test_compact_cast(case):
+    d = lxml2json(case.sub, ignore=("script",))
+    _ = lambda x: json.dumps(x, ensure_ascii=False, default=unfold)
+    assert _(json2compact(d)) == _(d)
+    assert compact2json(json2compact(d)) == d
+
+
+# check if wide compact nodes are walked & looked up consistently
+@pytest.mark.parametrize("width", [3, 50])
+def test_compact_wide(width):
+    d = {"p __text__=`%s`" % i: {"b": None} if i % 2 else None for i in range(
+        width
+    )}
+    node = json2compact(d)
+    assert [*node.items()] == [*d.items()] and [*node.values()] == [
+        json2compact(x) for x in d.values()
+    ]
+    assert all(node[k] == json2compact(v) for k,v in d.items())
+    assert ("p __text__=`1`", json2compact({"b": None})) in node.items()
+    with pytest.raises(KeyError):
+        node["missing"]
+
+
+# check if compact structure takes less memory than the JSON one
+def test_compact_memory():
+    s = "<html><body>%s</body></html>" % ("<ul>%s</ul>" % (
+        '<li class="item">1</li>' * 10
+    ) * 100)
+
+    def _measure(f: t.Callable) -> int:
+        tracemalloc.start()
+        _ = [f(lxml2json(s)) for _ in range(10)]
+        size = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        return size
+
+    assert _measure(json2compact) < _measure(lambda x: x) * 0.75
+
+
+# check if bytes-like source is decoded & parsed the same way as str one
+@pytest.mark.parametrize("case", [
+    Test(x, y, z) for x,y,z in [(
+        "utf8_no_meta",
+        "<html><body><p>Привет, мир</p></body></html>",
+        "utf-8"
+    ), (
+        "utf8_bom",
+        "﻿<html><body><p>Привет, мир</p></body></html>",
+        "utf-8"
+    ), (
+        "utf16_bom",
+        "﻿<html><body><p>Привет, мир</p></body></html>",
+        "utf-16-le"
+    ), (
+        "cp1251_meta",
+        '<html><head><meta charset="windows-1251"></head><body><p>Привет, мир</p></body></html>',
+        "cp1251"
+    ), (
+        "cp1251_http_equiv",
+        '<html><head><meta http-equiv="Content-Type" content="text/html; charset=windows-1251"></head><body><p>Привет, мир</p></body></html>',
+        "cp1251"
+    ), (
+        "fragment",
+        "<div>\n  <p>Привет, мир</p>\n</div>",
+        "utf-8"
+    )]
+], ids=lambda x: x.id)
+def test_bytes_cast(case):
+    b = case.sub.encode(case.res)
+    d = lxml2json(case.sub.lstrip("﻿"))
+    assert lxml2json(b) == d
+    assert lxml2json(memoryview(b)) == d
+    assert validate(b)
+
+
+# check if new lines & gaps are removed right on the tree
+def test_prepare():
+    e = prepare('<div>\n  <p title="a\nb">1\n2</p>  \n<p class="">  </p></div>')
+    assert html.tostring(e, encoding="unicode") == (
+        '<div><p title="ab">12</p><p class=""></p></div>'
+    )
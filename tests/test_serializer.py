@@ -0,0 +1,61 @@
+import typing as t
+
+import pytest
+
+from diff4html import HtmlDict
+from diff4html import serializer
+from diff4html.html import json2compact
+
+
+@pytest.fixture(params=[*serializer.BACKENDS])
+def backend(request) -> t.Iterator[str]:
+    """ Switch serializer backend for a test & restore it afterwards """
+    default = serializer.serializer.name
+    serializer.use(request.param)
+    yield request.param
+    serializer.use(default)
+
+
+PAIRS: list[tuple[str, str]] = [(
+    '<div class="1">2</div>',
+    '<div class="1">3</div>'
+), (
+    '<ul><li>1</li><li>1</li></ul><p>a, b: c</p>',
+    '<ul><li>1</li><li>1</li></ul><p>a: b, c</p>'
+), (
+    '<ul><li>1</li><li>1</li></ul><p>a, b: c</p>',
+    '<ul><li>1</li><li>1</li><li>1</li></ul>'
+), (
+    '<div title=\'"q"\'>\\</div><p>{"a": [1, 2]}</p>',
+    '<div title=\'"q"\'>\\\\</div><span>é \x7f</span>'
+)]
+""" Pairs of pages with separators, quotes & escapes in strings """
+
+
+# check if every backend produces the same dumps & offsets as json does
+@pytest.mark.parametrize("pair", PAIRS)
+def test_conformance(backend, pair):
+    docs = [HtmlDict(f"<html><body>{x}</body></html>") for x in pair]
+    d = docs[1] - docs[0]
+    dumps = [str(x) for x in docs], str(d)
+    assert serializer.dumps(json2compact(docs[0].data)) == dumps[0][0]
+
+    serializer.use("json")
+    _d = docs[1] - docs[0]
+    assert ([str(x) for x in docs], str(_d)) == dumps
+    assert _d.data == d.data
+
+    serializer.use(backend)
+    assert docs[0] + d == docs[1]
+
+
+# check if unknown backend can't be used
+def test_unknown_backend():
+    with pytest.raises(ValueError):
+        serializer.use("unknown")
+
+
+# check if strings unsupported by fast backends fall back to json
+def test_fallback(backend):
+    o = {"p __text__=`\udc80`": [{"b": None}], "i": None}
+    assert serializer.dumps(o) == serializer.Serializer().dumps(o)